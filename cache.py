@@ -0,0 +1,43 @@
+"""Tiny in-process TTL cache for hot, slowly-changing values.
+
+Stands in for Redis on the single-process prototype; the interface is
+kept small so a Redis-backed implementation can replace the singleton
+when the app runs with multiple workers.
+"""
+from threading import Lock
+from time import monotonic
+
+
+class TTLCache:
+    def __init__(self):
+        self._store = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < monotonic():
+                del self._store[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._store[key] = (monotonic() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._store.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Drop every key for which predicate(key) is true"""
+        with self._lock:
+            for key in [k for k in self._store if predicate(k)]:
+                del self._store[key]
+
+
+cache = TTLCache()
@@ -1,17 +1,114 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from math import cos, radians, sin
 
-db = SQLAlchemy()
+# Objects stay readable after commit: the default expire-on-commit
+# turns every post-commit attribute access into a hidden re-SELECT,
+# which the handlers here (flash + redirect after commit) never need
+db = SQLAlchemy(session_options={'expire_on_commit': False})
 
-# Association table for request-contributor matching
-request_contributors = db.Table('request_contributors',
-    db.Column('request_id', db.Integer, db.ForeignKey('emergency_request.id'), primary_key=True),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('status', db.String(20), default='pending'),  # pending, accepted, completed, declined
-    db.Column('responded_at', db.DateTime)
-)
+
+class StringEnum(db.TypeDecorator):
+    """Store a small closed set of strings as SmallInteger codes.
+
+    Python code and templates keep working with the string values; only
+    the storage narrows to 1-2 bytes, which shrinks both rows and every
+    composite index keyed on these columns. Codes are the 1-based
+    position in the values tuple, so new values must be appended, never
+    inserted. Values outside the set bind as NULL (matching nothing on
+    reads, rejected by NOT NULL on writes).
+    """
+    impl = db.SmallInteger
+    cache_ok = True
+
+    def __init__(self, values, **kwargs):
+        super().__init__(**kwargs)
+        self.values = tuple(values)
+        self._to_code = {value: code for code, value in enumerate(self.values, start=1)}
+        self._to_value = {code: value for value, code in self._to_code.items()}
+
+    def process_bind_param(self, value, dialect):
+        if not value:
+            return None
+        return self._to_code.get(value)
+
+    def process_literal_param(self, value, dialect):
+        return str(self._to_code[value])
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self._to_value[value]
+
+
+ROLE = StringEnum(('hospital', 'blood_bank', 'ngo', 'ambulance', 'volunteer', 'donor'))
+BLOOD_GROUP = StringEnum(('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-'))
+RESOURCE_TYPE = StringEnum(('blood', 'plasma', 'oxygen', 'ambulance', 'volunteer'))
+REQUEST_STATUS = StringEnum(('open', 'matching', 'partially_fulfilled', 'fulfilled',
+                             'cancelled', 'expired'))
+URGENCY = StringEnum(('critical', 'urgent', 'normal'))
+RESPONSE_STATUS = StringEnum(('notified', 'accepted', 'declined', 'completed', 'no_response'))
+CONTRIBUTION_TYPE = StringEnum(('fulfillment', 'verification', 'referral', 'partnership'))
+VEHICLE_TYPE = StringEnum(('basic', 'advanced', 'icu'))
+OXYGEN_TYPE = StringEnum(('cylinder', 'concentrator'))
+PARTNERSHIP_TYPE = StringEnum(('formal', 'informal', 'network'))
+PARTNERSHIP_STATUS = StringEnum(('pending', 'active', 'inactive'))
+
+# One bit per blood group (position in the BLOOD_GROUP values tuple).
+# Stored alongside blood_group so compatibility filters are one integer
+# AND against a precomputed mask instead of an IN over eight codes.
+BLOOD_GROUP_BIT = {value: 1 << i for i, value in enumerate(BLOOD_GROUP.values)}
+
+# Latitude band height for zone ids (~28km); radius searches join on
+# zone_id +/- a band count instead of scanning raw coordinates
+ZONE_HEIGHT_DEG = 0.25
+
+
+def zone_for_latitude(latitude):
+    """Map a latitude to its integer zone band (None passes through)"""
+    if latitude is None:
+        return None
+    return int((latitude + 90.0) / ZONE_HEIGHT_DEG)
+
+
+def trig_for_degrees(degrees):
+    """(sin, cos) of an angle in degrees, or (None, None) for None.
+
+    Stored alongside coordinates so distance refinement can use the
+    spherical law of cosines with no per-pair trig calls.
+    """
+    if degrees is None:
+        return None, None
+    rad = radians(degrees)
+    return sin(rad), cos(rad)
+
+CONTRIBUTOR_STATUS = StringEnum(('pending', 'accepted', 'completed', 'declined'))
+
+
+class RequestContributor(db.Model):
+    """Request-contributor matching with response state.
+
+    Promoted from a plain association table: the payload columns
+    (status, responded_at) make it an entity in its own right, and the
+    composite indexes let "my pending matches" and per-request status
+    lookups run as index scans instead of join-table scans.
+    """
+    __tablename__ = 'request_contributors'
+    request_id = db.Column(db.Integer, db.ForeignKey('emergency_request.id'),
+                           primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    status = db.Column(CONTRIBUTOR_STATUS, default='pending')
+    responded_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_rc_user_status', 'user_id', 'status'),
+        db.Index('ix_rc_request_status', 'request_id', 'status'),
+    )
 
 
 class User(UserMixin, db.Model):
@@ -23,7 +120,7 @@ class User(UserMixin, db.Model):
     phone = db.Column(db.String(20), nullable=False)
     
     # Role: hospital, blood_bank, ngo, ambulance, volunteer, donor
-    role = db.Column(db.String(20), nullable=False)
+    role = db.Column(ROLE, nullable=False)
     
     # Location
     city = db.Column(db.String(100), nullable=False)
@@ -31,9 +128,16 @@ class User(UserMixin, db.Model):
     address = db.Column(db.Text)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
-    
+    zone_id = db.Column(db.Integer, index=True)  # derived from latitude
+    # Precomputed trig of the coordinates, maintained by _derive_geo
+    sin_lat = db.Column(db.Float)
+    cos_lat = db.Column(db.Float)
+    sin_lon = db.Column(db.Float)
+    cos_lon = db.Column(db.Float)
+
     # For blood donors
-    blood_group = db.Column(db.String(5))  # A+, A-, B+, B-, AB+, AB-, O+, O-
+    blood_group = db.Column(BLOOD_GROUP)  # A+, A-, B+, B-, AB+, AB-, O+, O-
+    blood_group_bits = db.Column(db.SmallInteger)  # maintained by _derive_blood_bits
     last_donation_date = db.Column(db.Date)
     
     # Availability toggle
@@ -53,29 +157,122 @@ class User(UserMixin, db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     verification_document = db.Column(db.String(255))
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Relationships
-    resources = db.relationship('Resource', backref='owner', lazy='dynamic')
-    requests_created = db.relationship('EmergencyRequest', backref='requester', lazy='dynamic', 
-                                       foreign_keys='EmergencyRequest.requester_id')
-    
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=datetime.utcnow)
+    
+    # Relationships. resources loads via selectin (one IN query per
+    # batch); requester rides along the request query as an inner join
+    # so list views never lazy-load one row at a time.
+    resources = db.relationship('Resource', backref='owner', lazy='selectin')
+    requests_created = db.relationship(
+        'EmergencyRequest',
+        backref=db.backref('requester', lazy='joined', innerjoin=True),
+        lazy='dynamic', foreign_keys='EmergencyRequest.requester_id')
+
+    # Composite indexes matching the contributor-search filter prefixes
+    __table_args__ = (
+        db.Index('ix_user_match', 'is_available', 'role', 'city', 'blood_group'),
+        db.Index('ix_user_district', 'district', 'city'),
+        # Role-only scans (leaderboards, network counters) can't use
+        # ix_user_match because is_available leads that index
+        db.Index('ix_user_role', 'role'),
+        # Backs the bounding-box prefilter in the radius search
+        db.Index('ix_user_latlon', 'latitude', 'longitude'),
+        # Backs the in-DB donor eligibility predicate (can_donate)
+        db.Index('ix_user_donor_eligibility', 'blood_group', 'city', 'last_donation_date'),
+        # Partial index over just the matchable donor pool; stays tiny
+        # however large the full user table grows
+        db.Index('ix_user_donor_pool', 'city', 'blood_group',
+                 sqlite_where=db.and_(is_available, role == 'donor'),
+                 postgresql_where=db.and_(is_available, role == 'donor')),
+    )
+    
+    @validates('latitude', 'longitude')
+    def _derive_geo(self, key, value):
+        if key == 'latitude':
+            self.zone_id = zone_for_latitude(value)
+            self.sin_lat, self.cos_lat = trig_for_degrees(value)
+        else:
+            self.sin_lon, self.cos_lon = trig_for_degrees(value)
+        return value
+
+    @validates('blood_group')
+    def _derive_blood_bits(self, key, value):
+        self.blood_group_bits = BLOOD_GROUP_BIT.get(value)
+        return value
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
+        self.password_hash = generate_password_hash(
+            password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
-    
-    def can_donate_blood(self):
-        """Check if donor is eligible (56 days since last donation)"""
+
+    def password_needs_rehash(self):
+        """True if the stored hash predates the configured cost factor.
+
+        Compares only the method prefix (the part before the first '$'),
+        so a partially-specified config like 'scrypt' still matches the
+        parametrized form Werkzeug stores ('scrypt:32768:8:1') and logins
+        don't re-run the KDF needlessly on every visit.
+        """
+        stored_method = self.password_hash.split('$', 1)[0]
+        return not stored_method.startswith(
+            current_app.config['PASSWORD_HASH_METHOD'])
+    
+    @hybrid_property
+    def can_donate(self):
+        """Donor eligibility: 56 days since last donation.
+
+        Usable both per-instance and as a SQL predicate, so eligibility
+        filters run in the database against the last_donation_date index
+        instead of pulling donors into Python.
+        """
         if not self.last_donation_date:
             return True
         return datetime.now().date() - self.last_donation_date >= timedelta(days=56)
+
+    @can_donate.expression
+    def can_donate(cls):
+        return db.or_(cls.last_donation_date.is_(None),
+                      cls.last_donation_date <= db.func.date('now', '-56 day'))
+
+    def can_donate_blood(self):
+        """Check if donor is eligible (56 days since last donation)"""
+        return self.can_donate
     
     def is_organization(self):
         return self.role in ['hospital', 'blood_bank', 'ngo', 'ambulance']
     
+    @classmethod
+    def bulk_update_iri(cls, session, updates):
+        """Apply many IRI updates in a single executemany round trip.
+
+        updates is a list of dicts with keys uid, score, fulfilled_inc
+        and declined_inc. Counter arithmetic happens server-side, so no
+        User rows are loaded. update_iri stays the single-user path;
+        call this wherever a loop would otherwise invoke it per user
+        (e.g. closing out a request with many responders).
+        """
+        if not updates:
+            return
+        # Execute on the connection: the ORM session would otherwise
+        # reroute a multi-row UPDATE into per-PK bulk synchronization
+        session.connection().execute(
+            db.update(cls)
+            .where(cls.id == db.bindparam('uid'))
+            .values(
+                iri_score=db.bindparam('score'),
+                total_requests_received=cls.total_requests_received
+                    + db.bindparam('fulfilled_inc') + db.bindparam('declined_inc'),
+                total_requests_fulfilled=cls.total_requests_fulfilled
+                    + db.bindparam('fulfilled_inc'),
+                total_requests_declined=cls.total_requests_declined
+                    + db.bindparam('declined_inc'),
+            ),
+            updates
+        )
+
     def update_iri(self, fulfilled=True, response_time_minutes=0):
         """Update Individual Reliability Index based on response behavior"""
         self.total_requests_received += 1
@@ -106,18 +303,18 @@ class Resource(db.Model):
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Resource type: blood, plasma, oxygen, ambulance, volunteer
-    resource_type = db.Column(db.String(20), nullable=False)
+    resource_type = db.Column(RESOURCE_TYPE, nullable=False)
     
     # For blood/plasma
-    blood_group = db.Column(db.String(5))
+    blood_group = db.Column(BLOOD_GROUP)
     units_available = db.Column(db.Integer, default=1)
     
     # For ambulance
-    vehicle_type = db.Column(db.String(50))  # basic, advanced, icu
+    vehicle_type = db.Column(VEHICLE_TYPE)  # basic, advanced, icu
     vehicle_number = db.Column(db.String(20))
     
     # For oxygen
-    oxygen_type = db.Column(db.String(20))  # cylinder, concentrator
+    oxygen_type = db.Column(OXYGEN_TYPE)  # cylinder, concentrator
     capacity_liters = db.Column(db.Integer)
     
     # Availability
@@ -125,8 +322,13 @@ class Resource(db.Model):
     available_from = db.Column(db.DateTime)
     available_until = db.Column(db.DateTime)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=datetime.utcnow)
+
+    # Composite index for availability searches by resource type
+    __table_args__ = (
+        db.Index('ix_resource_avail', 'resource_type', 'is_available', 'blood_group'),
+    )
 
 
 class EmergencyRequest(db.Model):
@@ -135,25 +337,35 @@ class EmergencyRequest(db.Model):
     requester_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Request details
-    resource_type = db.Column(db.String(20), nullable=False)  # blood, plasma, oxygen, ambulance, volunteer
-    blood_group = db.Column(db.String(5))  # For blood/plasma requests
+    resource_type = db.Column(RESOURCE_TYPE, nullable=False)  # blood, plasma, oxygen, ambulance, volunteer
+    blood_group = db.Column(BLOOD_GROUP)  # For blood/plasma requests
+    blood_group_bits = db.Column(db.SmallInteger)  # maintained by _derive_blood_bits
     units_needed = db.Column(db.Integer, default=1)
     
     # Urgency: critical, urgent, normal
-    urgency = db.Column(db.String(20), nullable=False, default='normal')
+    urgency = db.Column(URGENCY, nullable=False, default='normal')
+    # Numeric urgency (critical=3, urgent=2, normal=1) so ORDER BY sorts
+    # correctly and can be index-backed; set alongside urgency at insert
+    urgency_rank = db.Column(db.SmallInteger, index=True)
     
-    # Location
+    # Location (coordinates copied from the requester at creation so
+    # radius matching never has to join back to the user row)
     city = db.Column(db.String(100), nullable=False)
     district = db.Column(db.String(100))
-    hospital_name = db.Column(db.String(200))
-    address = db.Column(db.Text)
-    
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    zone_id = db.Column(db.Integer, index=True)  # derived from latitude
+    # Precomputed trig of the coordinates, maintained by _derive_geo
+    sin_lat = db.Column(db.Float)
+    cos_lat = db.Column(db.Float)
+    sin_lon = db.Column(db.Float)
+    cos_lon = db.Column(db.Float)
+
     # Patient info (anonymized)
     patient_age = db.Column(db.Integer)
-    patient_condition = db.Column(db.Text)
     
     # Status: open, matching, partially_fulfilled, fulfilled, cancelled, expired
-    status = db.Column(db.String(20), default='open')
+    status = db.Column(REQUEST_STATUS, default='open')
     
     # Matching
     search_radius_km = db.Column(db.Integer, default=25)
@@ -164,8 +376,8 @@ class EmergencyRequest(db.Model):
     fulfilled_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=datetime.utcnow)
     fulfilled_at = db.Column(db.DateTime)
     expires_at = db.Column(db.DateTime)
     
@@ -176,6 +388,82 @@ class EmergencyRequest(db.Model):
     # Relationships
     responses = db.relationship('RequestResponse', backref='request', lazy='dynamic')
     fulfilled_by = db.relationship('User', foreign_keys=[fulfilled_by_id])
+    # Free-text columns live in a narrow side table so matcher and feed
+    # scans stay on fixed-width rows; selectin keeps list views at one
+    # extra query per batch
+    detail = db.relationship('EmergencyRequestDetail', backref='request',
+                             uselist=False, lazy='selectin',
+                             cascade='all, delete-orphan')
+
+    # Pass-throughs so templates and callers keep the flat attribute names
+    @property
+    def hospital_name(self):
+        return self.detail.hospital_name if self.detail else None
+
+    @property
+    def address(self):
+        return self.detail.address if self.detail else None
+
+    @property
+    def patient_condition(self):
+        return self.detail.patient_condition if self.detail else None
+
+    @validates('latitude', 'longitude')
+    def _derive_geo(self, key, value):
+        if key == 'latitude':
+            self.zone_id = zone_for_latitude(value)
+            self.sin_lat, self.cos_lat = trig_for_degrees(value)
+        else:
+            self.sin_lon, self.cos_lon = trig_for_degrees(value)
+        return value
+
+    @validates('blood_group')
+    def _derive_blood_bits(self, key, value):
+        self.blood_group_bits = BLOOD_GROUP_BIT.get(value)
+        return value
+
+    # Composite indexes matching the open-request scan and requester lookups
+    __table_args__ = (
+        db.Index('ix_req_match', 'status', 'city', 'resource_type', 'blood_group'),
+        db.Index('ix_req_requester_status', 'requester_id', 'status'),
+        db.Index('ix_req_feed', 'status', 'city', 'urgency_rank', 'created_at'),
+        # At most one open request per requester/resource/blood group,
+        # enforced in the DB so concurrent submissions cannot race the
+        # application-level duplicate check (blood_group coalesced so
+        # NULLs collide too; 0 is never a valid enum code)
+        db.Index('uq_open_request', 'requester_id', 'resource_type',
+                 db.func.coalesce(blood_group, 0), unique=True,
+                 sqlite_where=(status == 'open'),
+                 postgresql_where=(status == 'open')),
+        # Partial index over just the live requests; most rows end up
+        # fulfilled/expired, so the full-status indexes keep growing
+        # while this one only ever holds the working set
+        db.Index('ix_req_open_partial', 'resource_type', 'blood_group', 'city',
+                 sqlite_where=status.in_(('open', 'matching')),
+                 postgresql_where=status.in_(('open', 'matching'))),
+    )
+
+
+class EmergencyRequestDetail(db.Model):
+    """Cold free-text fields split out of EmergencyRequest.
+
+    These are only read on the request detail page, so keeping them off
+    the hot table shrinks the rows the matcher and feed queries scan.
+    """
+    request_id = db.Column(db.Integer, db.ForeignKey('emergency_request.id'),
+                           primary_key=True)
+    hospital_name = db.Column(db.String(200))
+    address = db.Column(db.Text)
+    patient_condition = db.Column(db.Text)
+
+    # Trigram index so hospital typeahead (ILIKE '%q%') is
+    # index-assisted on Postgres; needs CREATE EXTENSION pg_trgm there.
+    # Other dialects ignore the GIN kwargs and build a plain index.
+    __table_args__ = (
+        db.Index('ix_req_detail_hospital_trgm', 'hospital_name',
+                 postgresql_using='gin',
+                 postgresql_ops={'hospital_name': 'gin_trgm_ops'}),
+    )
 
 
 class RequestResponse(db.Model):
@@ -185,14 +473,14 @@ class RequestResponse(db.Model):
     responder_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Status: notified, accepted, declined, completed, no_response
-    status = db.Column(db.String(20), default='notified')
+    status = db.Column(RESPONSE_STATUS, default='notified')
     
     # Units offered/provided
     units_offered = db.Column(db.Integer, default=1)
     units_provided = db.Column(db.Integer, default=0)
     
     # Timestamps
-    notified_at = db.Column(db.DateTime, default=datetime.utcnow)
+    notified_at = db.Column(db.DateTime, server_default=db.func.now())
     responded_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
@@ -200,7 +488,9 @@ class RequestResponse(db.Model):
     requester_rating = db.Column(db.Integer)  # 1-5
     responder_notes = db.Column(db.Text)
     
-    responder = db.relationship('User', backref='responses')
+    # Responders render next to every response row, so join them eagerly
+    responder = db.relationship('User', backref='responses',
+                                lazy='joined', innerjoin=True)
 
 
 class ContributionLog(db.Model):
@@ -210,7 +500,7 @@ class ContributionLog(db.Model):
     request_id = db.Column(db.Integer, db.ForeignKey('emergency_request.id'))
     
     # Contribution type: fulfillment, verification, referral, partnership
-    contribution_type = db.Column(db.String(20), nullable=False)
+    contribution_type = db.Column(CONTRIBUTION_TYPE, nullable=False)
     
     # ECC earned
     ecc_earned = db.Column(db.Integer, default=0)
@@ -218,11 +508,23 @@ class ContributionLog(db.Model):
     # Details
     description = db.Column(db.Text)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
     
     user = db.relationship('User', backref='contributions')
 
 
+class StatsCounter(db.Model):
+    """Maintained counters for cheap site-wide statistics.
+
+    Incremented by mapper events as users register and requests move
+    through their lifecycle, so hot pages read one tiny table instead
+    of aggregating over the full user/request tables. Views that need
+    exact numbers can still run a real COUNT.
+    """
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
 class Partnership(db.Model):
     """Track partnerships between organizations"""
     id = db.Column(db.Integer, primary_key=True)
@@ -230,15 +532,15 @@ class Partnership(db.Model):
     organization_b_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Partnership type: formal, informal, network
-    partnership_type = db.Column(db.String(20), default='network')
+    partnership_type = db.Column(PARTNERSHIP_TYPE, default='network')
     
     # Status: pending, active, inactive
-    status = db.Column(db.String(20), default='pending')
+    status = db.Column(PARTNERSHIP_STATUS, default='pending')
     
     # Collaboration metrics
     successful_collaborations = db.Column(db.Integer, default=0)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
     
     org_a = db.relationship('User', foreign_keys=[organization_a_id])
     org_b = db.relationship('User', foreign_keys=[organization_b_id])